@@ -4,8 +4,8 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import contextlib
+import functools
 import hashlib
-import itertools
 import json
 import os
 import platform
@@ -13,19 +13,18 @@
 import shutil
 import sys
 import tempfile
-from typing import Dict, List, Optional, Sequence
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import llnl.path
 import llnl.util.lang
 import llnl.util.tty as tty
-from llnl.util.filesystem import path_contains_subdirectory, paths_containing_libs
+from llnl.util.filesystem import paths_containing_libs
 
 import spack.caches
 import spack.error
 import spack.schema.environment
 import spack.spec
 import spack.util.executable
-import spack.util.libc
 import spack.util.module_cmd
 import spack.version
 from spack.util.environment import filter_system_paths
@@ -36,8 +35,25 @@
 PATH_INSTANCE_VARS = ["cc", "cxx", "f77", "fc"]
 FLAG_INSTANCE_VARS = ["cflags", "cppflags", "cxxflags", "fflags"]
 
+#: attributes the hash and the cache key of a compiler are computed from
+_HASHED_ATTRIBUTES = frozenset(
+    PATH_INSTANCE_VARS
+    + FLAG_INSTANCE_VARS
+    + [
+        "spec",
+        "operating_system",
+        "target",
+        "flags",
+        "modules",
+        "alias",
+        "environment",
+        "extra_rpaths",
+        "enable_implicit_rpaths",
+    ]
+)
+
 
-@llnl.util.lang.memoized
+@functools.lru_cache(maxsize=256)
 def _get_compiler_version_output(compiler_path, version_arg, ignore_errors=()) -> str:
     """Invokes the compiler at a given path passing a single
     version argument and returns the output.
@@ -93,17 +109,18 @@ def tokenize_flags(flags_values, propagate=False):
     return flags_with_propagation
 
 
-#: regex for parsing linker lines
-_LINKER_LINE = re.compile(r"^( *|.*[/\\])" r"(link|ld|([^/\\]+-)?ld|collect2)" r"[^/\\]*( |$)")
-
-#: components of linker lines to ignore
-_LINKER_LINE_IGNORE = re.compile(r"(collect2 version|^[A-Za-z0-9_]+=|/ldfe )")
+#: regex for parsing linker lines, excluding the components of linker lines to ignore
+_LINKER_LINE = re.compile(
+    r"^(?!collect2 version|[A-Za-z0-9_]+=|/ldfe )"
+    r"( *|.*[/\\])"
+    r"(link|ld|([^/\\]+-)?ld|collect2)"
+    r"[^/\\]*( |$)"
+)
 
-#: regex to match linker search paths
-_LINK_DIR_ARG = re.compile(r"^-L(.:)?(?P<dir>[/\\].*)")
-
-#: regex to match linker library path arguments
-_LIBPATH_ARG = re.compile(r"^[-/](LIBPATH|libpath):(?P<dir>.*)")
+#: regex to match linker search paths (-L<dir>) and library path arguments (/LIBPATH:<dir>)
+_LINK_DIR_ARG = re.compile(
+    r"^(?:-L(?:.:)?(?P<link_dir>[/\\].*)|[-/](?:LIBPATH|libpath):(?P<libpath_dir>.*))"
+)
 
 
 def _parse_link_paths(string):
@@ -114,20 +131,23 @@ def _parse_link_paths(string):
     ensure, e.g., that codes load the right libstdc++ for their compiler.
     """
     lib_search_paths = False
-    raw_link_dirs = []
+    # Link dirs are often repeated many times in the output, so they are
+    # deduplicated as they are found, keeping their order, before normalization
+    raw_link_dirs: Dict[str, None] = {}
     for line in string.splitlines():
         if lib_search_paths:
             if line.startswith("\t"):
-                raw_link_dirs.append(line[1:])
+                raw_link_dirs[line[1:]] = None
                 continue
             else:
                 lib_search_paths = False
         elif line.startswith("Library search paths:"):
             lib_search_paths = True
 
-        if not _LINKER_LINE.match(line):
+        # Cheap substring screen: most lines cannot be linker lines at all
+        if "ld" not in line and "link" not in line and "collect2" not in line:
             continue
-        if _LINKER_LINE_IGNORE.match(line):
+        if not _LINKER_LINE.match(line):
             continue
         tty.debug(f"implicit link dirs: link line: {line}")
 
@@ -138,19 +158,13 @@ def _parse_link_paths(string):
                 continue
 
             if next_arg:
-                raw_link_dirs.append(arg)
+                raw_link_dirs[arg] = None
                 next_arg = False
                 continue
 
             link_dir_arg = _LINK_DIR_ARG.match(arg)
             if link_dir_arg:
-                link_dir = link_dir_arg.group("dir")
-                raw_link_dirs.append(link_dir)
-
-            link_dir_arg = _LIBPATH_ARG.match(arg)
-            if link_dir_arg:
-                link_dir = link_dir_arg.group("dir")
-                raw_link_dirs.append(link_dir)
+                raw_link_dirs[link_dir_arg.group(link_dir_arg.lastgroup)] = None
 
     implicit_link_dirs = list()
     visited = set()
@@ -188,16 +202,23 @@ def _parse_non_system_link_dirs(string: str) -> List[str]:
     return list(p for p in link_dirs if not in_system_subdirectory(p))
 
 
-def in_system_subdirectory(path):
-    system_dirs = [
+#: normalized system directories, see ``path_contains_subdirectory``
+_SYSTEM_SUBDIRECTORIES = tuple(
+    os.path.abspath(x).rstrip(os.path.sep) + os.path.sep
+    for x in (
         "/lib/",
         "/lib64/",
         "/usr/lib/",
         "/usr/lib64/",
         "/usr/local/lib/",
         "/usr/local/lib64/",
-    ]
-    return any(path_contains_subdirectory(path, x) for x in system_dirs)
+    )
+)
+
+
+def in_system_subdirectory(path):
+    norm_path = os.path.abspath(path).rstrip(os.path.sep) + os.path.sep
+    return norm_path.startswith(_SYSTEM_SUBDIRECTORIES)
 
 
 class Compiler:
@@ -322,7 +343,30 @@ def __init__(
         # used for version checks for API, e.g. C++11 flag
         self._real_version = None
 
+        # caching values for the hash and the compiler cache key, which are computed lazily,
+        # and reset whenever an attribute they depend on is assigned. Modifying the value of
+        # such an attribute in place, e.g. compiler.environment["set"] = {...}, is not detected.
+        self._hash: Optional[int] = None
+        self._cache_key: Optional[str] = None
+
+        # caching the implicit rpaths, together with the compiler cache key they were computed for
+        self._implicit_rpaths: Optional[Tuple[str, List[str]]] = None
+
+        # caching the changes to os.environ made by compiler_environment, together with
+        # the environment they were computed from, to avoid loading modules repeatedly
+        self._environment_changes: Optional[Tuple[Dict[str, str], Dict[str, str], List[str]]] = (
+            None
+        )
+
+    def __setattr__(self, name, value):
+        if name in _HASHED_ATTRIBUTES:
+            super().__setattr__("_hash", None)
+            super().__setattr__("_cache_key", None)
+        super().__setattr__(name, value)
+
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
             self.cc == other.cc
             and self.cxx == other.cxx
@@ -339,7 +383,9 @@ def __eq__(self, other):
         )
 
     def __hash__(self):
-        return hash(
+        if self._hash is not None:
+            return self._hash
+        self._hash = hash(
             (
                 self.cc,
                 self.cxx,
@@ -355,6 +401,15 @@ def __hash__(self):
                 self.enable_implicit_rpaths,
             )
         )
+        return self._hash
+
+    @property
+    def cache_key(self) -> str:
+        """Key of this compiler in the compiler cache"""
+        if self._cache_key is None:
+            as_bytes = json.dumps(self.to_dict(), separators=(",", ":")).encode("utf-8")
+            self._cache_key = hashlib.sha256(as_bytes).hexdigest()
+        return self._cache_key
 
     def verify_executables(self):
         """Raise an error if any of the compiler executables is not valid.
@@ -405,6 +460,12 @@ def implicit_rpaths(self) -> List[str]:
         if self.enable_implicit_rpaths is False:
             return []
 
+        # Reuse the result computed for the same compiler cache entry, if any. This assumes that
+        # the libraries in the implicit link dirs do not change during the life of the compiler.
+        key = self.cache_key
+        if self._implicit_rpaths is not None and self._implicit_rpaths[0] == key:
+            return list(self._implicit_rpaths[1])
+
         output = self.compiler_verbose_output
 
         if not output:
@@ -413,7 +474,9 @@ def implicit_rpaths(self) -> List[str]:
         link_dirs = _parse_non_system_link_dirs(output)
 
         all_required_libs = list(self.required_libs) + Compiler._all_compiler_rpath_libraries
-        return list(paths_containing_libs(link_dirs, all_required_libs))
+        result = list(paths_containing_libs(link_dirs, all_required_libs))
+        self._implicit_rpaths = (key, result)
+        return list(result)
 
     @property
     def default_dynamic_linker(self) -> Optional[str]:
@@ -423,6 +486,8 @@ def default_dynamic_linker(self) -> Optional[str]:
         if not output:
             return None
 
+        import spack.util.libc
+
         return spack.util.libc.parse_dynamic_linker(output)
 
     @property
@@ -438,6 +503,8 @@ def default_libc(self) -> Optional["spack.spec.Spec"]:
         if not dynamic_linker:
             return None
 
+        import spack.util.libc
+
         return spack.util.libc.libc_from_dynamic_linker(dynamic_linker)
 
     @property
@@ -464,14 +531,14 @@ def _compile_dummy_c_source(self) -> Optional[str]:
         if not cc or not self.verbose_flag:
             return None
 
+        tmpdir = tempfile.mkdtemp(prefix="spack-implicit-link-info")
         try:
-            tmpdir = tempfile.mkdtemp(prefix="spack-implicit-link-info")
             fout = os.path.join(tmpdir, "output")
             fin = os.path.join(tmpdir, f"main.{ext}")
 
-            with open(fin, "w") as csource:
+            with open(fin, "wb") as csource:
                 csource.write(
-                    "int main(int argc, char* argv[]) { (void)argc; (void)argv; return 0; }\n"
+                    b"int main(int argc, char* argv[]) { (void)argc; (void)argv; return 0; }\n"
                 )
             cc_exe = spack.util.executable.Executable(cc)
             for flag_type in ["cflags" if cc == self.cc else "cxxflags", "cppflags", "ldflags"]:
@@ -615,7 +682,7 @@ def default_version(cls, cc):
         return cls.extract_version_from_output(output)
 
     @classmethod
-    @llnl.util.lang.memoized
+    @functools.lru_cache(maxsize=256)
     def extract_version_from_output(cls, output: str) -> str:
         """Extracts the version from compiler's output."""
         match = re.search(cls.version_regex, output)
@@ -626,11 +693,15 @@ def cc_version(cls, cc):
         return cls.default_version(cc)
 
     @classmethod
+    @functools.lru_cache(maxsize=None)
     def search_regexps(cls, language):
-        # Compile all the regular expressions used for files beforehand.
+        # Compile the regular expression used for files beforehand.
         # This searches for any combination of <prefix><name><suffix>
-        # defined for the compiler
+        # defined for the compiler, with a single pattern that is memoized
+        # per class and language.
         compiler_names = getattr(cls, "{0}_names".format(language))
+        if not compiler_names:
+            return []
         prefixes = [""] + cls.prefixes
         suffixes = [""]
         if sys.platform == "win32":
@@ -640,10 +711,15 @@ def search_regexps(cls, language):
             suffixes = suffixes + cls.suffixes + cls_suf + ext_suf
         else:
             suffixes = suffixes + cls.suffixes
-        regexp_fmt = r"^({0}){1}({2})$"
+        regexp_fmt = r"^({0})(?:{1})({2})$"
         return [
-            re.compile(regexp_fmt.format(prefix, re.escape(name), suffix))
-            for prefix, name, suffix in itertools.product(prefixes, compiler_names, suffixes)
+            re.compile(
+                regexp_fmt.format(
+                    "|".join(prefixes),
+                    "|".join(re.escape(name) for name in compiler_names),
+                    "|".join(suffixes),
+                )
+            )
         ]
 
     def setup_custom_environment(self, pkg, env):
@@ -684,12 +760,27 @@ def compiler_environment(self):
         backup_env = os.environ.copy()
 
         try:
-            # load modules and set env variables
-            for module in self.modules:
-                spack.util.module_cmd.load_module(module)
+            if self._environment_changes and self._environment_changes[0] == backup_env:
+                # same initial environment as last time, so replay the changes directly
+                _, updated, removed = self._environment_changes
+                os.environ.update(updated)
+                for name in removed:
+                    os.environ.pop(name, None)
+            else:
+                # load modules and set env variables
+                for module in self.modules:
+                    spack.util.module_cmd.load_module(module)
+
+                # apply other compiler environment changes
+                spack.schema.environment.parse(self.environment).apply_modifications()
 
-            # apply other compiler environment changes
-            spack.schema.environment.parse(self.environment).apply_modifications()
+                updated = {
+                    name: value
+                    for name, value in os.environ.items()
+                    if backup_env.get(name) != value
+                }
+                removed = [name for name in backup_env if name not in os.environ]
+                self._environment_changes = (backup_env, updated, removed)
 
             yield
         finally:
@@ -792,6 +883,18 @@ def __init__(self, cache: "FileCache") -> None:
         self.cache = cache
         self.cache.init_entry(self.name)
         self._data: Dict[str, Dict[str, Optional[str]]] = {}
+        #: stamp of the cache file when it was last read, see _file_stamp
+        self._stamp: Optional[Tuple[int, int, int]] = None
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """Returns the inode, modification time and size of the cache file, or None if it does
+        not exist. Writes rename a new file into place, so the stamp changes even when the
+        modification time, which has a coarse resolution on some filesystems, does not."""
+        try:
+            st = os.stat(self.cache.cache_path(self.name))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
 
     def _get_entry(self, key: str) -> Optional[CompilerCacheEntry]:
         try:
@@ -803,44 +906,57 @@ def _get_entry(self, key: str) -> Optional[CompilerCacheEntry]:
         return None
 
     def get(self, compiler: Compiler) -> CompilerCacheEntry:
-        # Cache hit
-        try:
-            with self.cache.read_transaction(self.name) as f:
-                assert f is not None
-                self._data = json.loads(f.read())
-                assert isinstance(self._data, dict)
-        except (json.JSONDecodeError, AssertionError):
-            self._data = {}
-
         key = self._key(compiler)
+
+        # Cache hit. The file is parsed again only if it was modified since we last read it.
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            try:
+                with self.cache.read_transaction(self.name) as f:
+                    assert f is not None
+                    self._data = json.loads(f.read())
+                    assert isinstance(self._data, dict)
+            except (json.JSONDecodeError, AssertionError):
+                self._data = {}
+            self._stamp = stamp
+
         value = self._get_entry(key)
         if value is not None:
             return value
 
         # Cache miss
         with self.cache.write_transaction(self.name) as (old, new):
-            try:
-                assert old is not None
-                self._data = json.loads(old.read())
-                assert isinstance(self._data, dict)
-            except (json.JSONDecodeError, AssertionError):
-                self._data = {}
+            # Parse the file again only if another process modified it since we read it.
+            contents: Optional[str] = None
+            if self._file_stamp() != self._stamp:
+                try:
+                    assert old is not None
+                    contents = old.read()
+                    self._data = json.loads(contents)
+                    assert isinstance(self._data, dict)
+                except (json.JSONDecodeError, AssertionError):
+                    self._data = {}
 
             # Use cache entry that may have been created by another process in the meantime.
+            # In that case the file is unchanged, and its contents are written back as is.
             entry = self._get_entry(key)
 
             # Finally compute the cache entry
             if entry is None:
                 self._data[key] = self.value(compiler)
                 entry = CompilerCacheEntry.from_dict(self._data[key])
+                contents = json.dumps(self._data, separators=(",", ":"))
 
-            new.write(json.dumps(self._data, separators=(",", ":")))
+            assert contents is not None
+            new.write(contents)
 
-            return entry
+        # Another process may write the file as soon as the lock is released, so its stamp cannot
+        # be attributed to the data we hold. Force the file to be read again on the next access.
+        self._stamp = None
+        return entry
 
     def _key(self, compiler: Compiler) -> str:
-        as_bytes = json.dumps(compiler.to_dict(), separators=(",", ":")).encode("utf-8")
-        return hashlib.sha256(as_bytes).hexdigest()
+        return compiler.cache_key
 
 
 def _make_compiler_cache():
@@ -2,10 +2,9 @@
 # Spack Project Developers. See the top-level COPYRIGHT file for details.
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
+import functools
 import re
 
-import llnl.util.lang
-
 import spack.compiler
 import spack.compilers.clang
 from spack.version import Version
@@ -15,7 +14,7 @@ class AppleClang(spack.compilers.clang.Clang):
     openmp_flag = "-Xpreprocessor -fopenmp"
 
     @classmethod
-    @llnl.util.lang.memoized
+    @functools.lru_cache(maxsize=256)
     def extract_version_from_output(cls, output):
         ver = "unknown"
         match = re.search(
@@ -3,11 +3,10 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import functools
 import os
 import re
 
-import llnl.util.lang
-
 from spack.compiler import Compiler, UnsupportedCompilerFlag
 from spack.version import Version
 
@@ -172,7 +171,7 @@ def fc_pic_flag(self):
     required_libs = ["libclang"]
 
     @classmethod
-    @llnl.util.lang.memoized
+    @functools.lru_cache(maxsize=256)
     def extract_version_from_output(cls, output):
         ver = "unknown"
         if ("Apple" in output) or ("AMD" in output):
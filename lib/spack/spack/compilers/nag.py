@@ -3,11 +3,10 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import functools
 import os
 import re
 
-import llnl.util.lang
-
 import spack.compiler
 
 
@@ -24,7 +23,7 @@ class Nag(spack.compiler.Compiler):
     version_argument = "-V"
 
     @classmethod
-    @llnl.util.lang.memoized
+    @functools.lru_cache(maxsize=256)
     def extract_version_from_output(cls, output):
         match = re.search(r"NAG Fortran Compiler Release (\d+).(\d+)\(.*\) Build (\d+)", output)
         if match:
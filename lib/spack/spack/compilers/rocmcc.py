@@ -3,10 +3,9 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import functools
 import re
 
-import llnl.util.lang
-
 import spack.compilers.clang
 
 
@@ -43,7 +42,7 @@ def c11_flag(self):
         return "-std=c11"
 
     @classmethod
-    @llnl.util.lang.memoized
+    @functools.lru_cache(maxsize=256)
     def extract_version_from_output(cls, output):
         match = re.search(r"llvm-project roc-(\d+)[._](\d+)[._](\d+)", output)
         if match:
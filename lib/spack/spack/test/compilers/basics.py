@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 """Test basic behavior of compilers in Spack"""
+import hashlib
 import json
 import os
 from copy import copy
@@ -111,9 +112,18 @@ def test_implicit_rpaths(dirs_with_libfiles, monkeypatch):
         "_compile_dummy_c_source",
         lambda self: "ld " + " ".join(f"-L{d}" for d in all_dirs),
     )
-    retrieved_rpaths = MockCompiler().implicit_rpaths()
+    compiler = MockCompiler()
+    retrieved_rpaths = compiler.implicit_rpaths()
     assert set(retrieved_rpaths) == set(lib_to_dirs["libstdc++"] + lib_to_dirs["libgfortran"])
 
+    # The result is cached for the same compiler cache entry
+    monkeypatch.setattr(spack.compiler, "_parse_non_system_link_dirs", lambda output: [])
+    assert compiler.implicit_rpaths() == retrieved_rpaths
+
+    # A change to the compiler, and to its cache entry, requires parsing the output again
+    compiler.extra_rpaths = ["/extra/rpath"]
+    assert compiler.implicit_rpaths() == []
+
 
 without_flag_output = "ld -L/path/to/first/lib -L/path/to/second/lib64"
 with_flag_output = "ld -L/path/to/first/with/flag/lib -L/path/to/second/lib64"
@@ -939,3 +949,197 @@ def test_compiler_output_caching(tmp_path):
     cache = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
     assert cache.get(d).c_compiler_output == "gcc helloworld.c -o helloworld"
     assert cache.get(d).real_version == "1.0.0"
+
+
+def test_search_regexps_are_cached_per_class_and_language():
+    """Tests that search regexps are compiled once, and not shared among compiler classes."""
+
+    class FooCompiler(Compiler):
+        cc_names = ["foocc"]
+        cxx_names = ["foo++"]
+        suffixes = [r"-\d+"]
+
+    class BarCompiler(FooCompiler):
+        cc_names = ["barcc"]
+
+    try:
+        assert FooCompiler.search_regexps("cc") is FooCompiler.search_regexps("cc")
+        assert len(FooCompiler.search_regexps("cc")) == 1
+        assert any(r.match("foocc-12") for r in FooCompiler.search_regexps("cc"))
+        assert not any(r.match("foocc") for r in FooCompiler.search_regexps("cxx"))
+        assert any(r.match("barcc") for r in BarCompiler.search_regexps("cc"))
+        assert not any(r.match("foocc") for r in BarCompiler.search_regexps("cc"))
+    finally:
+        # Do not keep the classes defined in this test alive in the cache
+        Compiler.search_regexps.cache_clear()
+
+
+def test_compiler_output_caching_in_memory(tmp_path, monkeypatch):
+    """Test that the cache file is not parsed again, unless it was modified."""
+    cache = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    a = MockCompilerWithoutExecutables()
+    assert cache.get(a).real_version == "1.0.0"
+    # After a write, the file is read once more, since another process may have modified it
+    assert cache.get(a).real_version == "1.0.0"
+
+    def _read_transaction(*args, **kwargs):
+        pytest.fail("the cache file should not be read again")
+
+    with monkeypatch.context() as m:
+        m.setattr(cache.cache, "read_transaction", _read_transaction)
+        assert cache.get(a).real_version == "1.0.0"
+        assert cache.get(MockCompilerWithoutExecutables()).real_version == "1.0.0"
+
+    # A modification of the file, e.g. by another process, is picked up
+    cache._data = {}
+    cache._stamp = None
+    assert cache.get(a).real_version == "1.0.0"
+    assert cache._data
+    assert a._get_real_version_count == 1
+
+
+def test_compiler_output_caching_concurrent_writes(tmp_path, monkeypatch):
+    """Test that entries written by another process right after a write are kept, even if the
+    stamp of the cache file does not change."""
+    first = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    second = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    monkeypatch.setattr(spack.compiler.FileCompilerCache, "_file_stamp", lambda self: (1, 1, 1))
+
+    compilers = [MockCompilerWithoutExecutables() for _ in range(3)]
+    for i, compiler in enumerate(compilers):
+        compiler.modules = [f"gcc/{i}"]
+
+    first.get(compilers[0])
+    second.get(compilers[1])
+    first.get(compilers[2])
+
+    with open(first.cache.cache_path(first.name)) as f:
+        assert len(json.load(f)) == 3
+
+
+def test_compiler_output_caching_write_after_read(tmp_path):
+    """Test that entries written by another process after the cache file was read are kept, even
+    if the modification time of the cache file does not change."""
+    first = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    second = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    path = first.cache.cache_path(first.name)
+
+    compilers = [MockCompilerWithoutExecutables() for _ in range(3)]
+    for i, compiler in enumerate(compilers):
+        compiler.modules = [f"gcc/{i}"]
+
+    # Write the file with another process, and read it
+    second.get(compilers[0])
+    first.get(compilers[0])
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    # Another process adds an entry within the resolution of the modification time
+    second.get(compilers[1])
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    first.get(compilers[2])
+    with open(path) as f:
+        assert len(json.load(f)) == 3
+
+
+@pytest.mark.parametrize(
+    "cc", ["/opt/gcc/bin/gcc", "/opt/caf\u00e9/bin/gcc", "/opt/x\udcff/bin/gcc"]
+)
+def test_compiler_cache_key(tmp_path, cc):
+    """Tests that cache keys are stable, so that existing cache entries are reused."""
+    compiler = Compiler(
+        "gcc@=13.2.0",
+        operating_system="ubuntu20.04",
+        target="x86_64",
+        paths=[cc, None, None, None],
+    )
+    as_bytes = json.dumps(compiler.to_dict(), separators=(",", ":")).encode("utf-8")
+    cache = spack.compiler.FileCompilerCache(FileCache(str(tmp_path)))
+    assert cache._key(compiler) == hashlib.sha256(as_bytes).hexdigest()
+
+
+def test_compiler_equality_ignores_environment_key_order():
+    """Tests that compilers differing only in the order of environment keys are equal"""
+
+    def _compiler(environment):
+        return Compiler(
+            "gcc@=13.2.0",
+            operating_system="ubuntu20.04",
+            target="x86_64",
+            paths=["/test/bin/gcc", "/test/bin/g++"],
+            environment=environment,
+        )
+
+    a = _compiler({"set": {"A": "1", "B": "2"}})
+    b = _compiler({"set": {"B": "2", "A": "1"}})
+    assert a == b
+    assert b in [a]
+
+
+def test_compiler_hash_and_cache_key_follow_assignments():
+    """Tests that the cached hash and cache key are reset when a compiler attribute is assigned"""
+    a = Compiler(
+        "gcc@=13.2.0",
+        operating_system="ubuntu20.04",
+        target="x86_64",
+        paths=["/test/bin/gcc", None],
+    )
+    b = copy(a)
+    assert hash(a) == hash(b) and a.cache_key == b.cache_key
+
+    a.modules = ["gcc/13.2.0"]
+    assert a != b
+    assert hash(a) != hash(b) and a.cache_key != b.cache_key
+
+    a.modules = []
+    assert a == b
+    assert hash(a) == hash(b) and a.cache_key == b.cache_key
+
+
+def test_compiler_environment_loads_modules_once(working_env, monkeypatch):
+    """Test that modules are not loaded again when the initial environment is unchanged"""
+    loaded = []
+
+    def _load_module(module):
+        loaded.append(module)
+        os.environ["MODULE_LOADED"] = module
+        os.environ.pop("TO_BE_REMOVED", None)
+
+    monkeypatch.setattr(spack.util.module_cmd, "load_module", _load_module)
+    os.environ["TO_BE_REMOVED"] = "1"
+    compiler = Compiler(
+        "gcc@=13.2.0",
+        operating_system="ubuntu20.04",
+        target="x86_64",
+        paths=["/test/bin/gcc", "/test/bin/g++"],
+        modules=["gcc/13.2.0"],
+        environment={"set": {"TEST": "yes"}},
+    )
+
+    for _ in range(2):
+        with compiler.compiler_environment():
+            assert os.environ["MODULE_LOADED"] == "gcc/13.2.0"
+            assert os.environ["TEST"] == "yes"
+            assert "TO_BE_REMOVED" not in os.environ
+        assert "MODULE_LOADED" not in os.environ and os.environ["TO_BE_REMOVED"] == "1"
+    assert loaded == ["gcc/13.2.0"]
+
+    # A different initial environment requires loading modules again
+    os.environ["OTHER"] = "1"
+    with compiler.compiler_environment():
+        assert os.environ["MODULE_LOADED"] == "gcc/13.2.0"
+    assert loaded == ["gcc/13.2.0", "gcc/13.2.0"]
+
+
+@pytest.mark.parametrize(
+    "flags,expected",
+    [
+        ("", []),
+        ("-O2 -g", ["-O2", "-g"]),
+        ("-O0 -foo-flag foo-val", ["-O0", "-foo-flag foo-val"]),
+        ("-isystem  /opt/x\t-I /y z -", ["-isystem /opt/x", "-I /y z", "-"]),
+        ("value -O2", ["value", "-O2"]),
+    ],
+)
+def test_tokenize_flags(flags, expected):
+    assert spack.compiler.tokenize_flags(flags, True) == [(x, True) for x in expected]
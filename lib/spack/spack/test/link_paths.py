@@ -9,7 +9,7 @@
 import pytest
 
 import spack.paths
-from spack.compiler import _parse_non_system_link_dirs
+from spack.compiler import _parse_link_paths, _parse_non_system_link_dirs
 
 drive = ""
 if sys.platform == "win32":
@@ -202,3 +202,17 @@ def test_obscure_parsing_rules():
         paths.remove(os.path.join(root, "second", "path"))
 
     check_link_paths("obscure-parsing-rules.txt", paths)
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        "ld -L/opt/gcc/lib64 foo.o",
+        "progress\r\nld -L/opt/gcc/lib64 foo.o\r\n",
+        "progress\rld -L/opt/gcc/lib64 foo.o",
+        "progress\x0cld -L/opt/gcc/lib64 foo.o",
+    ],
+)
+def test_link_paths_line_boundaries(output):
+    """Tests that lines are split on the same boundaries as str.splitlines()"""
+    assert _parse_link_paths(output) == [os.path.abspath("/opt/gcc/lib64")]
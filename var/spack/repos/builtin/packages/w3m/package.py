@@ -85,30 +85,32 @@ def url_for_version(self, version):
     def patch(self):
         # w3m is not developed since 2012, everybody is doing this:
         # https://www.google.com/search?q=USE_EGD+w3m
-        filter_file("#define USE_EGD", "#undef USE_EGD", "config.h.in")
+        filter_file("#define USE_EGD", "#undef USE_EGD", "config.h.in", string=True)
 
     def _add_arg_for_variant(self, args, variant, choices):
-        for avail_lib in choices:
-            if self.spec.variants[variant].value == avail_lib:
-                args.append("--with-{0}={1}".format(variant, avail_lib))
-                return
+        value = self.spec.variants[variant].value
+        if value in choices:
+            args.append("--with-{0}={1}".format(variant, value))
 
     def configure_args(self):
         args = ["ac_cv_search_gettext=no", "--enable-unicode"]
 
         self._add_arg_for_variant(args, "termlib", ("termcap", "ncurses"))
-        if "+image" in self.spec:
+        if self.spec.variants["image"].value:
             args.append("--enable-image")
             self._add_arg_for_variant(args, "imagelib", ("gdk-pixbuf", "imlib2"))
 
         return args
 
     def setup_build_environment(self, env):
-        if self.spec.variants["termlib"].value == "ncurses":
-            env.append_flags("LDFLAGS", "-ltinfo")
-            env.append_flags("LDFLAGS", "-lncurses")
-        if "+image" in self.spec:
-            env.append_flags("LDFLAGS", "-lX11")
+        variants = self.spec.variants
+        ldflags = []
+        if variants["termlib"].value == "ncurses":
+            ldflags.extend(["-ltinfo", "-lncurses"])
+        if variants["image"].value:
+            ldflags.append("-lX11")
+        if ldflags:
+            env.append_flags("LDFLAGS", " ".join(ldflags))
 
     # parallel build causes build failure
     parallel = False